@@ -1,20 +1,56 @@
 #coding: utf-8
 """
 Converts some ActionScript3 to a JavaScript file.
-Usage:  python as2js.py actionscriptFile.as [...]
+Usage:  python as2js.py [convert] actionscriptFile.as [...]
     Overwrites each .js file parallel to each .as file.
-Usage:  python as2js.py --test
-    Just run unit tests.
+    --timeout SECONDS   Wall-clock budget per file of a batch.  0 runs in this process,
+                        as does a single file.
+    --summary PATH      Write JSON summary of each file and its elapsed time.
+    --method-workers N  Convert methods of each class in N processes.
+                        A batch of files also needs --timeout 0, or --pipeline 0.
+    --cache DIR         Reuse each parsed class, unless its source changed.
+    --target NAME       Emit cc (extend idiom), es2015 (class) or commonjs.
+                        Repeat to emit several from one parse:  View.cc.js, View.es2015.js
+    --lazy-requires     Require each imported module on first use of its class.
+                        Only with --target commonjs, which exports each class.
+    --local-statics     Declare private static variables and functions in the module,
+                        and reference them directly instead of through the class.
+    --compact           Omit comments and indentation, and shorten private names.
+                        Print bytes saved by each file.
+    --pipeline WORKERS  Read, convert in WORKERS processes, and write in overlapping stages.
+                        0 converts in this process.  Prints files/s and MB/s.
+    --depth N           Files buffered between pipeline stages.
+Usage:  python as2js.py startup Entry.as --src DIR
+    Lists modules loaded on startup of the entry class, with and without lazy requires.
+Usage:  python as2js.py [convert] --src DIR --out DIR
+    Converts each .as file under source directory into a parallel tree of .js files.
+    Writes each .js file only if its content changed.
+    Exit code is 0 if each file converted, 1 if any failed or timed out, 2 if usage error.
+Usage:  python as2js.py selftest
+    Just run unit tests.  Same as --test.
+Usage:  python as2js.py bench
+    Time startup and conversion of one file, within cfg.benchBudget seconds.
 Forked from 06\_jw as2js by Ethan Kennerly.
 """
 
+import bisect
 import codecs
 import os
 import re
+import sys
 import textwrap
+import time
 
 import as2js_cfg as cfg
 
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
 literal = r'[\w\-\."\'\\]+'
 argument = '(\w+)\s*(:\w+)?(\s*=\s*' + literal + ')?'
 var = 'var'
@@ -98,13 +134,21 @@ def staticProps(klassName, klassContent):
     /* how many */
     FlxBasic.ACTIVECOUNT;
     """
-    staticProps = _parseProps(klassName, klassContent, staticPropP)
+    return _formatStaticProps(klassName,
+        _parseProps(klassName, klassContent, staticPropP))
+
+
+def _formatStaticProps(klassName, staticProps, locals = ()):
+    """Each of locals is a variable of the module, instead of a property of the class."""
     strs = []
     for comment, name, dataType, definition in staticProps:
         line = ''
         if comment:
             line = comment
-        line += klassName + '.' + name + definition + ';'
+        if name in locals:
+            line += 'var ' + name + definition + ';'
+        else:
+            line += klassName + '.' + name + definition + ';'
         strs.append(line)
     return '\n'.join(strs)
 
@@ -269,8 +313,20 @@ def props(klassContent, inConstructor = False, klassName = ''):
     <BLANKLINE>
         _ACTIVECOUNT: undefined,
     """
-    props = _parseProps(klassName, klassContent, propP)
-    strs = []
+    out = Writer()
+    out.depth = 1
+    _writeProps(out, _parseProps(klassName, klassContent, propP), inConstructor)
+    return out.getvalue()
+
+
+whitespaceLineP = re.compile('^[ \t]+$', re.M)
+
+def _writeProps(out, props, inConstructor = False):
+    if inConstructor:
+        separator = ';'
+    else:
+        separator = ','
+    written = False
     for comment, declaration, dataType, definition in props:
         if definition:
             if not inConstructor:
@@ -279,24 +335,15 @@ def props(klassContent, inConstructor = False, klassName = ''):
         else:
             definition = ': undefined'
             include = False
-        line = ''
-        if not inConstructor:
-            if comment:
-                line = comment
-        line += declaration + definition
         if not inConstructor or include:
-            strs.append(line)
-    str = ''
-    if inConstructor:
-        separator = ';'
-    else:
-        separator = ','
-    if strs:
-        lineSeparator = separator + '\n'
-        str = lineSeparator.join(strs)
-        str = indent(str, 1)
-        str += separator
-    return str
+            if written:
+                out.write('\n')
+            if not inConstructor and comment:
+                out.write(comment)
+            definition = re.sub(whitespaceLineP, '',
+                definition.replace('\r\n', '\n'))
+            out.write(declaration + definition + separator)
+            written = True
 
 
 def _formatComment(blockComment):
@@ -372,66 +419,165 @@ def _parseFuncs(klassName, klassContent, funcP, instance = True):
     >>> print funcs[0]['argumentText']
     score
     """
+    funcs = _parseContentFuncs(klassName, klassContent, funcP, instance)
+    return [{'blockComment': func.blockComment, 
+            'name': func.name, 
+            'argumentText': func.argumentText, 
+            'content': _expand(func.content), 
+            'defaults': _expand(func.defaults)}
+        for func in funcs]
+
+
+def _parseContentFuncs(klassName, klassContent, funcP, instance = True):
     escaped = _escapeEnds(klassContent)
-    funcs = funcP.findall(escaped)
+    staticDeclarations, instanceDeclarations = _findClassDeclarations(
+        klassName, escaped)
+    defaults = ''
+    if instance:
+        defaults = _constructorDefaults(
+            _parseProps(klassName, klassContent, propP))
+    return _parseFuncRecords(klassName, escaped, funcP, instance,
+        staticDeclarations, instanceDeclarations, defaults)
+
+
+def _findClassDeclarations(klassName, escaped):
+    """Return static declarations and instance declarations."""
     staticDeclarations = _findDeclarations(escaped, 
         [staticPropP, staticMethodP])
+    instanceDeclarations = _findDeclarations(escaped, [
+        propP, methodP], excludes = [klassName])
+    return staticDeclarations, instanceDeclarations
+
+
+def _constructorDefaults(props):
+    out = Writer(indentUnit)
+    out.depth = 1
+    _writeProps(out, props, True)
+    return out.getvalue()
+
+
+def _parseFuncRecords(klassName, escaped, funcP, instance,
+        staticDeclarations, instanceDeclarations, defaults):
+    funcs = funcP.findall(escaped)
+    context = (klassName, instance, staticDeclarations,
+        instanceDeclarations, defaults)
+    return _mapFuncs(context, funcs)
+
+
+indentUnit = '\x02'
+logMarker = '\x01.log\x01'
+superClassMarker = '\x01.super\x01'
+
+def _expand(text, superName = None):
+    r"""Apply emit settings to parsed text:  indent, log and super class.
+    Parsed text marks these with characters that are not in source code.
+    >>> print _expand(indentUnit + logMarker + '(1);')
+        cc.log(1);
+    """
+    if superName is None:
+        superName = cfg.superClass
+    return text.replace(indentUnit, cfg.indent) \
+        .replace(logMarker, cfg.log) \
+        .replace(superClassMarker, superName)
+
+
+def _transformFunc(context, func):
+    """Independent of other functions, once the class context is known.
+    Independent of emit settings, which _expand applies.
+    """
+    klassName, instance, staticDeclarations, instanceDeclarations, defaults = context
+    blockComment, name, argumentAS, content = func
+    blockComment = _formatComment(blockComment)
+    name = indent(name, 0)
+    arguments = argumentP.findall(argumentAS)
+    argumentsJS = []
+    defaultArguments = []
+    argumentDeclarations = []
+    for declaration, dataType, definition in arguments:
+        if declaration not in argumentDeclarations:
+            argumentDeclarations.append(declaration)
+        argumentsJS.append(declaration)
+        if definition:
+            defaultArguments.append('if (undefined === ' + declaration + ') {')
+            defaultArguments.append(indentUnit + declaration + definition + ';')
+            defaultArguments.append('}')
     if instance:
-        instanceDeclarations = _findDeclarations(escaped, [
-            propP, methodP], excludes = [klassName])
-    formatted = []
-    for blockComment, name, argumentAS, content in funcs:
-        blockComment = _formatComment(blockComment)
-        name = indent(name, 0)
-        arguments = argumentP.findall(argumentAS)
-        argumentsJS = []
-        defaultArguments = []
-        argumentDeclarations = []
-        for declaration, dataType, definition in arguments:
-            if declaration not in argumentDeclarations:
-                argumentDeclarations.append(declaration)
-            argumentsJS.append(declaration)
-            if definition:
-                defaultArguments.append('if (undefined === ' + declaration + ') {')
-                defaultArguments.append(cfg.indent + declaration + definition + ';')
-                defaultArguments.append('}')
-        if instance:
-            thisInstanceDeclarations = exclude(instanceDeclarations, argumentDeclarations)
-        thisStaticDeclarations = exclude(staticDeclarations, argumentDeclarations)
+        thisInstanceDeclarations = exclude(instanceDeclarations, argumentDeclarations)
+    thisStaticDeclarations = exclude(staticDeclarations, argumentDeclarations)
+    if klassName != name:
         defaults = ''
-        if instance:
-            defaults = props(klassContent, True, klassName)
-            if defaults:
-                defaults = scopeMembers(thisInstanceDeclarations, defaults, 'this')
-        argumentText = ', '.join(argumentsJS)
-        defaultArgumentText = '\n'.join(defaultArguments)
-        if defaultArgumentText:
-            defaultArgumentText = '\n' + indent(defaultArgumentText, 1)
-        if not content or content.isspace():
-            content = ''
-        else:
-            content = localVariables(content)
-            content = trace(content)
-            content = superClass(content)
-            content = catch(content)
-            content = asType(content)
-            content = intType(content)
-            content = isInstanceOf(content)
-        content = indent(content, 1)
-        content = defaultArgumentText + content
-        if instance:
-            content = scopeMembers(thisInstanceDeclarations, content, 'this')
-        content = scopeMembers(thisStaticDeclarations, content, klassName)
-        formatted.append({'blockComment': blockComment, 
-            'name': name, 
-            'argumentText': argumentText, 
-            'content': content, 
-            'defaults': defaults, 
-            'defaultArguments': defaultArguments})
+    elif defaults:
+        defaults = scopeMembers(thisInstanceDeclarations, defaults, 'this')
+    argumentText = ', '.join(argumentsJS)
+    defaultArgumentText = '\n'.join(defaultArguments)
+    if defaultArgumentText:
+        defaultArgumentText = '\n' + indent(defaultArgumentText, 1, indentUnit)
+    if not content or content.isspace():
+        content = ''
+    else:
+        content = localVariables(content)
+        content = trace(content, logMarker)
+        content = superClass(content, superClassMarker)
+        content = catch(content)
+        content = asType(content)
+        content = intType(content)
+        content = isInstanceOf(content)
+    content = indent(content, 1, indentUnit)
+    content = defaultArgumentText + content
+    if instance:
+        content = scopeMembers(thisInstanceDeclarations, content, 'this')
+    content = scopeMembers(thisStaticDeclarations, content, klassName)
+    return ParsedFunc(blockComment, name, argumentText, content, defaults)
+
+
+def _transformFuncs(contextFuncs):
+    context, funcs = contextFuncs
+    return [_transformFunc(context, func) for func in funcs]
+
+
+_methodPool = None
+
+def _mapFuncs(context, funcs):
+    r"""Transform each function in source order.
+    With more than one cfg.methodWorkers, fan out chunks of functions to a worker pool,
+    unless this is already a worker, which may not have child processes.
+    The pool persists between classes.  Budget of the pool is cfg.timeout.
+
+    >>> klassContent = ''.join(['public function f%i(a:int=%i){return g + a;}' % (i, i)
+    ...     for i in range(9)]) + 'public var g:int;'
+    >>> serial = _parseFuncs('Klass', klassContent, methodP)
+    >>> cfg.methodWorkers = 2
+    >>> parallel = _parseFuncs('Klass', klassContent, methodP)
+    >>> cfg.methodWorkers = 1
+    >>> serial == parallel
+    True
+    >>> [func['name'] for func in parallel][-2:]
+    ['f7', 'f8']
+    """
+    global _methodPool
+    import multiprocessing
+    workers = cfg.methodWorkers
+    if workers <= 1 or len(funcs) < 2 * workers \
+            or multiprocessing.current_process().daemon:
+        return _transformFuncs((context, funcs))
+    size = -(-len(funcs) // (4 * workers))
+    tasks = [(context, funcs[f:f + size]) for f in range(0, len(funcs), size)]
+    if _methodPool is None:
+        _methodPool = _newPool(workers)
+    try:
+        chunks = _methodPool.map_async(_transformFuncs, tasks).get(
+            cfg.timeout or None)
+    except multiprocessing.TimeoutError:
+        _methodPool.terminate()
+        _methodPool = None
+        raise
+    formatted = []
+    for chunk in chunks:
+        formatted.extend(chunk)
     return formatted
 
 
-def indent(text, indents=1):
+def indent(text, indents=1, unit=None):
     r"""Standardize indent to a number of indents.
     >>> print indent('             ab\n                 c', 1)
         ab
@@ -445,12 +591,18 @@ def indent(text, indents=1):
     >>> print indent('                 ab\n                 c', 0)
     ab
     c
+
+    Unit of indent defaults to cfg.indent.
+    >>> print indent('  ab', 2, '\t').replace('\t', '<tab>')
+    <tab><tab>ab
     """
+    if unit is None:
+        unit = cfg.indent
     text = textwrap.dedent(text.replace('\r\n', '\n'))
     lines = []
     for line in text.splitlines():
         if line:
-            space = cfg.indent * indents
+            space = unit * indents
         else:
             space = ''
         lines.append(space + line)
@@ -458,11 +610,97 @@ def indent(text, indents=1):
     return text
 
 
-def _formatFunc(func, operator):
-    return func['blockComment'] + func['name'] + operator + 'function(' \
-        + func['argumentText'] \
-        + ')\n{' \
-        + func['content'] + '\n}'
+class Writer(object):
+    r"""Accumulate lines of output, each written once.
+    Indent each line by the depth when its first text was written.
+    Do not indent an empty line.
+    >>> out = Writer('  ')
+    >>> out.write('a {\n')
+    >>> out.depth += 1
+    >>> out.write('b;\n\nc;')
+    >>> out.depth -= 1
+    >>> out.write('\n}')
+    >>> print out.getvalue()
+    a {
+      b;
+    <BLANKLINE>
+      c;
+    }
+    """
+    def __init__(self, indent = None):
+        if indent is None:
+            indent = cfg.indent
+        self.indent = indent
+        self.depth = 0
+        self.lines = []
+        self.line = []
+        self.lineDepth = 0
+
+    def write(self, text):
+        pieces = text.split('\n')
+        self._append(pieces[0])
+        for piece in pieces[1:]:
+            self.lines.append(self._formatLine())
+            self.line = []
+            self._append(piece)
+
+    def _append(self, piece):
+        if piece:
+            if not self.line:
+                self.lineDepth = self.depth
+            self.line.append(piece)
+
+    def _formatLine(self):
+        if self.line:
+            return self.indent * self.lineDepth + ''.join(self.line)
+        return ''
+
+    def getvalue(self):
+        return '\n'.join(self.lines + [self._formatLine()])
+
+
+def _writeFunc(out, func, head, content, superName = None):
+    """Content is parsed, and expanded here."""
+    out.write(func.blockComment)
+    out.write(head + '(' + func.argumentText + ')\n{')
+    out.write(_expand(content, superName))
+    out.write('\n}')
+
+
+class _Record(object):
+    """Named fields in slots, which pickle as a compact tuple."""
+    __slots__ = ()
+
+    def __init__(self, *values):
+        self.__setstate__(values)
+
+    def __getstate__(self):
+        return tuple([getattr(self, name) for name in self.__slots__])
+
+    def __setstate__(self, values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    def __eq__(self, other):
+        return type(self) is type(other) \
+            and self.__getstate__() == other.__getstate__()
+
+    def __ne__(self, other):
+        return not self == other
+
+
+class ParsedFunc(_Record):
+    """Method or static function.  Content and defaults are not yet expanded."""
+    __slots__ = ('blockComment', 'name', 'argumentText', 'content', 'defaults')
+
+
+class ParsedClass(_Record):
+    """Everything emit needs from a class, independent of emit settings.
+    Props are lists of [blockComment, name, dataType, definition].
+    """
+    __slots__ = ('comment', 'name', 'modules', 'props', 'staticProps',
+        'methods', 'staticMethods', 'staticDeclarations',
+        'instanceDeclarations', 'base', 'privateNames')
 
 
 def _findDeclarations(klassContent, propPs, excludes = []):
@@ -478,24 +716,28 @@ def _findDeclarations(klassContent, propPs, excludes = []):
 
 superClassP = re.compile(r'(\s+)super\s*(\()')
 
-def superClass(funcContent):
+def superClass(funcContent, name = None):
     r"""Does not support call to another function.
     >>> print superClass('var a; super(a);\nsuper.f(1)');
     var a; this._super(a);
     super.f(1)
     """
-    return re.sub(superClassP, r'\1' + cfg.superClass + r'\2', funcContent)
+    if name is None:
+        name = cfg.superClass
+    return re.sub(superClassP, r'\1' + name + r'\2', funcContent)
 
 
 traceP = re.compile(r'(\s+)trace\s*(\()')
 
-def trace(funcContent):
+def trace(funcContent, log = None):
     r"""
     >>> print trace('var a; trace(a);\ntrace(1)');
     var a; cc.log(a);
     cc.log(1)
     """
-    return re.sub(traceP, r'\1' + cfg.log + r'\2', funcContent)
+    if log is None:
+        log = cfg.log
+    return re.sub(traceP, r'\1' + log + r'\2', funcContent)
 
 
 catchP = re.compile(r'(\bcatch\s*\()(\w+):[^\(]+\)')
@@ -616,14 +858,32 @@ def scopeMembers(memberDeclarations, funcContent, scope):
         if identifier in memberDeclarations:
             if identifier not in memberIdentifiers:
                 memberIdentifiers.append(identifier)
+    def prefix(match):
+        return match.group(1) + scope + '.' + match.group(2)
     for identifier in memberIdentifiers:
-        memberIdentifierP = re.compile(r'([^\w\."\']+)\b(%s)\b(?!:)' % identifier)
-        scoped = re.sub(memberIdentifierP, r'\1%s.\2' % scope, scoped)
-        caseP = re.compile(r'(\bcase\s+)\b(%s\s*:)' % identifier)
-        scoped = re.sub(caseP, r'\1%s.\2' % scope, scoped)
+        memberIdentifierP, caseP = _memberPatterns(identifier)
+        scoped = memberIdentifierP.sub(prefix, scoped)
+        scoped = caseP.sub(prefix, scoped)
     return scoped
 
 
+_memberPatternsCache = {}
+_memberPatternsLimit = 2048
+
+def _memberPatterns(identifier):
+    """Compiled once per identifier, since the re module cache only holds 100 patterns.
+    The cache is cleared when full, so a long batch does not grow it without bound.
+    """
+    patterns = _memberPatternsCache.get(identifier)
+    if patterns is None:
+        if _memberPatternsLimit <= len(_memberPatternsCache):
+            _memberPatternsCache.clear()
+        patterns = (re.compile(r'([^\w\."\']+)\b(%s)\b(?!:)' % identifier),
+            re.compile(r'(\bcase\s+)\b(%s\s*:)' % identifier))
+        _memberPatternsCache[identifier] = patterns
+    return patterns
+
+
 #                                                     override        private                     function    func    (int a    )      :    int    {         }  
 methodP =  re.compile(functionPrefix
     + notStatic
@@ -695,19 +955,24 @@ def methods(klassName, klassContent):
             PrefixStatics.f()
         }
     """
-    funcs = _parseFuncs(klassName, klassContent, methodP)
-    functionNames = [func['name'] for func in funcs]
-    strs = []
-    for func in funcs:
-        if klassName == func['name']:
-            func['name'] = 'ctor'
-            defaults = func['defaults']
-            if defaults:
-                func['content'] = '\n' + defaults + func['content']
-        str = _formatFunc(func, ': ')
-        str = indent(str, 1)
-        strs.append(str)
-    return ',\n\n'.join(strs)
+    out = Writer()
+    out.depth = 1
+    _writeMethods(out, klassName,
+        _parseContentFuncs(klassName, klassContent, methodP))
+    return out.getvalue()
+
+
+def _writeMethods(out, klassName, funcs):
+    for f, func in enumerate(funcs):
+        name = func.name
+        content = func.content
+        if klassName == name:
+            name = 'ctor'
+            if func.defaults:
+                content = '\n' + func.defaults + content
+        if f:
+            out.write(',\n\n')
+        _writeFunc(out, func, name + ': function', content)
 
 
 staticMethodP =  re.compile(functionPrefix
@@ -757,17 +1022,28 @@ def staticMethods(klassName, klassContent):
         function g(){}
     };
     """ 
-    funcs = _parseFuncs(klassName, klassContent, staticMethodP, False)
-    functionNames = [func['name'] for func in funcs]
-    strs = []
-    for func in funcs:
-        func['name'] = klassName + '.' + func['name']
-        str = _formatFunc(func, ' = ') + ';'
-        strs.append(str)
-    return '\n\n'.join(strs)
+    out = Writer()
+    _writeStaticMethods(out, klassName,
+        _parseContentFuncs(klassName, klassContent, staticMethodP, False))
+    return out.getvalue()
+
+
+def _writeStaticMethods(out, klassName, funcs, locals = ()):
+    """Each of locals is a function of the module, instead of a property of the class."""
+    for f, func in enumerate(funcs):
+        if f:
+            out.write('\n\n')
+        if func.name in locals:
+            _writeFunc(out, func, 'function ' + func.name, func.content)
+        else:
+            _writeFunc(out, func, klassName + '.' + func.name + ' = function',
+                func.content)
+            out.write(';')
 
 
 requireP = re.compile(r'\s*\bimport\s+([\w\.]+)')
+commentOrStringP = re.compile(r'//[^\n]*|/\*.*?\*/'
+    r'|"(?:\\.|[^"\\\n])*"' + r"|'(?:\\.|[^'\\\n])*'", re.S)
 
 def requires(text):
     r"""Reformat import statement as node.js require.
@@ -790,17 +1066,47 @@ def requires(text):
     >>> print requires('public var j:uint;')
     "use strict";
     <BLANKLINE>
+
+    Ignore import in a comment or string.  Require each module once.
+    >>> print requires('import a.B;\n// import a.C;\n/* import a.D; */\nvar s = " import a.E";\nimport a.B;')
+    /*jslint node: true */
+    "use strict";
+    <BLANKLINE>
+    require("a/B.js");
+    <BLANKLINE>
+    <BLANKLINE>
+    """
+    return _formatRequires(_findModules(text))
+
+
+def _findModules(text):
+    return requireP.findall(commentOrStringP.sub(' ', text))
+
+
+def _formatRequires(modules, bind = False):
+    r"""If bind, assign each imported class from its module, which exports the class.
+    >>> print _formatRequires(['a.Base', 'a.*'], True)
+    /*jslint node: true */
+    "use strict";
+    <BLANKLINE>
+    var Base = require("a/Base.js");
+    require("a/*.js");
+    <BLANKLINE>
+    <BLANKLINE>
     """
-    modules = requireP.findall(text)
     requiresText = ''
     if modules:
         requires = []
         for module in modules:
-            mod = module.replace('.', '/') + '.js'
-            for fromPath, toPath in cfg.requireSubs:
-                mod = mod.replace(fromPath, toPath)
-            req = 'require("%s");' % mod
-            requires.append(req)
+            name = _importName(module)
+            if bind and name:
+                req = 'var %s = require("%s");' % (name, requirePath(module))
+                if [r for r in requires if r.startswith('var %s ' % name)]:
+                    continue
+            else:
+                req = 'require("%s");' % requirePath(module)
+            if req not in requires:
+                requires.append(req)
         requires.insert(0, '/*jslint node: true */\n"use strict";\n')
         requiresText = '\n'.join(requires) + '\n\n'
     else:
@@ -809,6 +1115,270 @@ def requires(text):
     return requiresText
 
 
+lazyImports = '_imports'
+
+def _formatLazyRequires(modules, eager = ()):
+    r"""Bind each imported class as a property, which requires its module on first use.
+    The module exports the class, as the commonjs target does.
+    Require a wildcard import eagerly.
+    Bind each class named in eager as a variable, required now.
+    >>> print _formatLazyRequires(['flash.display.Bitmap', 'flash.geom.*', 'flash.geom.Point'], ['Point'])
+    /*jslint node: true */
+    "use strict";
+    <BLANKLINE>
+    require("flash/geom/*.js");
+    var Point = require("flash/geom/Point.js");
+    <BLANKLINE>
+    function _lazy(imports, name, path)
+    {
+        Object.defineProperty(imports, name, {configurable: true, get: function()
+        {
+            var value = require(path);
+            Object.defineProperty(imports, name, {value: value});
+            return value;
+        }});
+    }
+    <BLANKLINE>
+    var _imports = {};
+    _lazy(_imports, "Bitmap", "src/View/Bitmap.js");
+    <BLANKLINE>
+    <BLANKLINE>
+    """
+    names = [(name, module) for name, module in _importNames(modules)
+        if name not in eager]
+    if not names:
+        return _formatRequires(modules, True)
+    lines = ['/*jslint node: true */\n"use strict";\n']
+    eagerNames = []
+    for module in modules:
+        name = _importName(module)
+        if not name:
+            req = 'require("%s");' % requirePath(module)
+        elif name in eager and name not in eagerNames:
+            req = 'var %s = require("%s");' % (name, requirePath(module))
+            eagerNames.append(name)
+        else:
+            continue
+        if req not in lines:
+            lines.append(req)
+    if 2 <= len(lines):
+        lines.append('')
+    out = Writer()
+    out.write('function _lazy(imports, name, path)\n{\n')
+    out.depth += 1
+    out.write('Object.defineProperty(imports, name, {configurable: true, get: function()\n{\n')
+    out.depth += 1
+    out.write('var value = require(path);\n'
+        'Object.defineProperty(imports, name, {value: value});\n'
+        'return value;\n')
+    out.depth -= 1
+    out.write('}});\n')
+    out.depth -= 1
+    out.write('}\n')
+    lines.append(out.getvalue())
+    lines.append('var %s = {};' % lazyImports)
+    for name, module in names:
+        lines.append('_lazy(%s, "%s", "%s");' % (lazyImports, name,
+            requirePath(module)))
+    return '\n'.join(lines) + '\n\n'
+
+
+def _importName(module):
+    """Class name, or empty if a wildcard import."""
+    return re.sub(r'\W', '', module.split('.')[-1])
+
+
+def _importNames(modules):
+    """Name and module of each class imported, once per name."""
+    names = []
+    for module in modules:
+        name = _importName(module)
+        if name and name not in [n for n, m in names]:
+            names.append((name, module))
+    return names
+
+
+localNameP = re.compile(r'\b(?:var|const|let|function)\s+(\w+)'
+    r'|\bfunction\s*\w*\s*\(([^)]*)\)|\bcatch\s*\(\s*(\w+)')
+
+def _localNames(parsed):
+    r"""Names of arguments, local variables and local functions in any function.
+    A lazy reference to an imported class would replace a local of the same name,
+    so such an import is required when loading instead.
+    >>> sorted(_localNames(parse('package{public class K{public function f(Point:int, b){\n    var p = new Point();\n    [].map(function(q){});}}}')))
+    ['Point', 'b', 'p', 'q']
+    """
+    names = set()
+    for func in parsed.methods + parsed.staticMethods:
+        names.update(re.findall(r'\w+', func.argumentText))
+        for match in localNameP.finditer(func.content):
+            declared, arguments, caught = match.groups()
+            names.update(re.findall(r'\w+', declared or arguments or caught or ''))
+    return names
+
+
+def lazyReferences(text, names):
+    r"""Prefix each reference to an imported name, except in comments and strings.
+    >>> print lazyReferences('// Point\nvar p = new Point(a.Point, "Point", {Point: 1});', ['Point'])
+    // Point
+    var p = new _imports.Point(a.Point, "Point", {Point: 1});
+
+    A key follows an opening brace or a comma.  A ternary branch or case is a reference.
+    >>> print lazyReferences('var p = b ? Point: null;\nswitch (c) {case Point: break;}\nf({a: 1,\n    Point : Point});', ['Point'])
+    var p = b ? _imports.Point: null;
+    switch (c) {case _imports.Point: break;}
+    f({a: 1,
+        Point : _imports.Point});
+    """
+    if not names:
+        return text
+    alternatives = '|'.join(names)
+    referenceP = re.compile(commentOrStringP.pattern
+        + r'|[{,]\s*(?:' + alternatives + r')\s*:'
+        + r'|(?<![\w\.\$])\b(' + alternatives + r')\b', re.S)
+    def prefix(match):
+        if match.group(1):
+            return lazyImports + '.' + match.group(1)
+        return match.group(0)
+    return referenceP.sub(prefix, text)
+
+
+def loadedModules(parsed):
+    r"""Return modules required while loading the module, and modules only used later.
+    Loading evaluates the base class, props and static props.
+    >>> parsed = parse('package{import a.B;import a.C;import a.D;public class E extends B{public var c:C = new C();public function f(){new D();}}}')
+    >>> loadedModules(parsed)
+    (['a.B', 'a.C'], ['a.D'])
+    """
+    loaded = [parsed.base]
+    for comment, name, dataType, definition in parsed.props + parsed.staticProps:
+        loaded.append(definition)
+    loadedText = ' '.join(loaded)
+    eager = []
+    lazy = []
+    shadowed = _localNames(parsed)
+    for name, module in _importNames(parsed.modules):
+        if name in shadowed or re.search(r'\b%s\b' % name, loadedText):
+            eager.append(module)
+        else:
+            lazy.append(module)
+    for module in parsed.modules:
+        if not _importName(module):
+            eager.append(module)
+    return eager, lazy
+
+
+def startupModules(entryPath, srcDir):
+    """Modules loaded from the entry point, following each .as file found under source directory.
+    Return modules loaded eagerly with lazy requires, modules deferred until first use,
+    and modules loaded eagerly without lazy requires.
+    """
+    parsedPaths = {}
+    eager = _walkModules(entryPath, srcDir, True, parsedPaths)
+    everything = _walkModules(entryPath, srcDir, False, parsedPaths)
+    lazy = [module for module in everything if module not in eager]
+    return eager, lazy, everything
+
+
+def _walkModules(entryPath, srcDir, loadedOnly, parsedPaths):
+    modules = []
+    paths = [entryPath]
+    visited = set()
+    while paths:
+        path = paths.pop(0)
+        if path in visited:
+            continue
+        visited.add(path)
+        if path not in parsedPaths:
+            parsedPaths[path] = parseCached(path, _readBytes(path), cfg.cacheDir)
+        parsed = parsedPaths[path]
+        followed = parsed.modules
+        if loadedOnly:
+            followed = loadedModules(parsed)[0]
+        for module in followed:
+            if module not in modules:
+                modules.append(module)
+            modulePath = os.path.join(srcDir, *module.split('.')) + '.as'
+            if os.path.isfile(modulePath):
+                paths.append(modulePath)
+    return modules
+
+
+def startupReport(entryPath, srcDir):
+    r"""Print modules loaded on startup with and without lazy requires.
+    >>> startupReport(realpath('test/View.as'), realpath('test'))
+    Without lazy requires, loading View.as loads 10 modules.
+    With lazy requires, loading View.as loads 0 modules:
+    Deferred until first use, 10 modules:
+        flash.display.Bitmap
+        flash.display.BitmapData
+        flash.display.DisplayObject
+        flash.display.DisplayObjectContainer
+        flash.display.MovieClip
+        flash.display.Sprite
+        flash.geom.Matrix
+        flash.geom.Point
+        flash.geom.Rectangle
+        flash.events.MouseEvent
+    """
+    eager, lazy, everything = startupModules(entryPath, srcDir)
+    entry = os.path.basename(entryPath)
+    print 'Without lazy requires, loading %s loads %i modules.' % (
+        entry, len(everything))
+    for title, modules in [
+            ('With lazy requires, loading %s loads' % entry, eager),
+            ('Deferred until first use,', lazy)]:
+        print '%s %i modules:' % (title, len(modules))
+        for module in modules:
+            print '    ' + module
+
+
+_requireTable = {'subs': None, 'length': 0, 'prefixes': {}, 'paths': {}}
+
+def requirePath(module):
+    r"""Path of module, substituting the longest matching prefix in cfg.requireSubs.
+    A prefix matches whole path segments.
+    The table is compiled once per cfg.requireSubs, and each path is memoized between files.
+    The table is keyed on the identity and length of the list, so each lookup is constant time.
+    To change substitutions, assign a new list, rather than edit an entry in place.
+    >>> requireSubs = cfg.requireSubs
+    >>> cfg.requireSubs = [['flash', 'lib/flash'], ['flash/display', 'src/View'],
+    ...     ['flash/display/Bitmap.js', 'src/Bitmap.js']]
+    >>> requirePath('flash.display.Sprite')
+    'src/View/Sprite.js'
+    >>> requirePath('flash.display.Bitmap')
+    'src/Bitmap.js'
+    >>> requirePath('flash.geom.Point')
+    'lib/flash/geom/Point.js'
+    >>> requirePath('flashy.Point')
+    'flashy/Point.js'
+    >>> cfg.requireSubs = requireSubs
+    """
+    table = _requireTable
+    if table['subs'] is not cfg.requireSubs \
+            or table['length'] != len(cfg.requireSubs):
+        prefixes = {}
+        for fromPath, toPath in cfg.requireSubs:
+            if fromPath not in prefixes:
+                prefixes[fromPath] = toPath
+        table['subs'] = cfg.requireSubs
+        table['length'] = len(cfg.requireSubs)
+        table['prefixes'] = prefixes
+        table['paths'] = {}
+    path = table['paths'].get(module)
+    if path is None:
+        path = module.replace('.', '/') + '.js'
+        segments = path.split('/')
+        prefixes = table['prefixes']
+        for s in range(len(segments), 0, -1):
+            prefix = '/'.join(segments[:s])
+            if prefix in prefixes:
+                path = prefixes[prefix] + path[len(prefix):]
+                break
+        table['paths'][module] = path
+    return path
+
+
 #                     package   org.pkg   {       class   ClasA    extends   Clas{        }}
 klassCommentP =  re.compile('package\s*[\w\.]*\s*{[\s\S]*?' 
     + commentPrefix
@@ -865,37 +1435,1153 @@ def convertVector(text):
     text = re.sub(vectorLiteralP, '', text)
     return text
 
-def convert(text):
+def parse(text):
+    r"""Return ParsedClass, independent of emit settings.
+    >>> parse('package{}')
+    Traceback (most recent call last):
+    ...
+    ValueError: No class found in package.
+    """
     text = convertVector(text)
-    klassComment, klassName, klassContent = findClassAndContent(text)
+    found = findClassAndContent(text)
+    if not found:
+        raise ValueError('No class found in package.')
+    klassComment, klassName, klassContent = found
+    parsed = _parseClass(klassName, klassContent)
+    parsed.comment = klassComment
+    parsed.modules = _findModules(text)
+    bases = extendsP.findall(text)
+    if bases:
+        parsed.base = bases[0]
+    return parsed
+
+
+extendsP = re.compile(r'\bclass\s+\w+\s+extends\s+([\w\.]+)')
+
 
-    str = '';
-    str += requires(text)
-    if klassComment:
-        str += indent(klassComment, 0) + '\n'
-    str += 'var ' + klassName + ' = ' + cfg.baseClass + '.extend(\n{' 
-    str += '\n' + props(klassContent, False, klassName) 
-    str += '\n\n' + methods(klassName, klassContent)
-    str += '\n});'
-    str += '\n\n' + staticProps(klassName, klassContent)
-    str += '\n\n' + staticMethods(klassName, klassContent)
-    return str
+def _parseClass(klassName, klassContent):
+    escaped = _escapeEnds(klassContent)
+    staticDeclarations, instanceDeclarations = _findClassDeclarations(
+        klassName, escaped)
+    props = _parseProps(klassName, klassContent, propP)
+    methods = _parseFuncRecords(klassName, escaped, methodP, True,
+        staticDeclarations, instanceDeclarations, _constructorDefaults(props))
+    staticMethods = _parseFuncRecords(klassName, escaped, staticMethodP, False,
+        staticDeclarations, [], '')
+    return ParsedClass('', klassName, [], props,
+        _parseProps(klassName, klassContent, staticPropP),
+        methods, staticMethods, staticDeclarations, instanceDeclarations, '',
+        _findPrivateNames(klassContent))
+
+
+privateP = re.compile(r'(?:\bprivate\s+(?:static\s+)?|\bstatic\s+private\s+)'
+    r'(?:var|const|function)\s+(\w+)')
+
+def _findPrivateNames(klassContent):
+    r'''
+    >>> _findPrivateNames('private var a;public var b;static private function c(){}private static const d;')
+    ['a', 'c', 'd']
+    '''
+    names = []
+    for name in privateP.findall(klassContent):
+        if name not in names:
+            names.append(name)
+    return names
+
+
+def emit(parsed, target = 'cc', compacted = None):
+    """JavaScript of parsed class, with emit settings in cfg.
+    Target names an emitter in emitters.
+    With cfg.localStatics, private statics are variables and functions of the module.
+    With cfg.lazyRequires, reference each imported class through a lazy binding.
+    Compacted defaults to cfg.compact.
+    """
+    text = emitters[target](parsed)
+    if cfg.localStatics:
+        text = localReferences(text, parsed.name, localStatics(parsed))
+    if cfg.lazyRequires:
+        shadowed = _localNames(parsed)
+        names = [name for name, module in _importNames(parsed.modules)
+            if name not in shadowed]
+        text = lazyReferences(text, names)
+    if compacted is None:
+        compacted = cfg.compact
+    if compacted:
+        text = compactClass(text, parsed)
+    return text
+
+
+def compactClass(text, parsed):
+    r"""Compact, and shorten private names with a prefix of the class,
+    so a subclass does not overwrite a private member of its base class.
+    >>> base = parse('package{public class Base{private var remaining:int = 0;public function f(){\n    remaining++;}}}')
+    >>> sub = parse('package{public class Sub extends Base{private var labelText:String = "x";public function g(){\n    labelText = "y";}}}')
+    >>> print compactClass(emit(base, 'commonjs', False), base)
+    "use strict";
+    function Base()
+    {
+    this.$Base$a = 0;
+    }
+    Base.prototype.f = function()
+    {
+    this.$Base$a++;
+    };
+    Base.prototype.$Base$a = 0;
+    module.exports = Base;
+    >>> print compactClass(emit(sub, 'commonjs', False), sub)
+    "use strict";
+    function Sub()
+    {
+    Base.call(this);
+    this.$Sub$a = "x";
+    }
+    Sub.prototype = Object.create(Base.prototype);
+    Sub.prototype.constructor = Sub;
+    Sub.prototype.g = function()
+    {
+    this.$Sub$a = "y";
+    };
+    Sub.prototype.$Sub$a = "x";
+    module.exports = Sub;
+    """
+    return shortenPrivates(compact(text), parsed.name, parsed.privateNames,
+        parsed.base)
+
+
+regexLiteral = (r'(?:[(,=:\[!&|?{};]|^|\breturn)[ \t]*'
+    r'/(?![/*])(?:\\.|\[(?:\\.|[^\]\\\n])*\]|[^/\\\n\[])+/[a-z]*')
+
+commentP = re.compile(r'("(?:\\.|[^"\\\n])*"' + r"|'(?:\\.|[^'\\\n])*'|"
+    + regexLiteral + r')|/\*.*?\*/|//[^\n]*', re.S | re.M)
+
+def compact(text):
+    r'''Without comments, indentation or empty lines.
+    Keep each line, since a statement may end at a line without a semicolon.
+    >>> print compact('/* a */\nvar a = 1 // one\n\n    f("// not a comment",\n    /* b */ a);')
+    var a = 1
+    f("// not a comment",
+    a);
+
+    Keep a regular expression, which may look like a comment.  Division is not one.
+    >>> print compact('s = s.replace(/\\/\\//g, "") / 2 // half\nreturn /[/*]/.test(s);')
+    s = s.replace(/\/\//g, "") / 2
+    return /[/*]/.test(s);
+    '''
+    def strip(match):
+        comment = match.group(0)
+        if match.group(1):
+            return comment
+        if comment.startswith('/*'):
+            return ' '
+        return ''
+    text = commentP.sub(strip, text)
+    lines = []
+    for line in text.split('\n'):
+        line = line.strip()
+        if line:
+            lines.append(line)
+    return '\n'.join(lines)
+
+
+def shortenPrivates(text, klassName, privateNames, base = ''):
+    r'''Rename each private member to a short name, where that is safe within the class:
+    each reference is through this or the class, or declares the member,
+    and no string or regular expression mentions the name.
+    Each short name has a prefix of the class, since an instance of a subclass
+    has the properties of the base class too.
+    >>> print shortenPrivates('var K = cc.Class.extend(\n{\ncounter: 0,\nlabel: 1,\nf: function()\n{\nthis.counter++;\nK.totalSum = this.label + "label";\n}\n});\nK.totalSum = 0;', 'K', ['counter', 'label', 'totalSum'])
+    var K = cc.Class.extend(
+    {
+    $K$a: 0,
+    label: 1,
+    f: function()
+    {
+    this.$K$a++;
+    K.$K$b = this.label + "label";
+    }
+    });
+    K.$K$b = 0;
+
+    A key of an object literal in a function is not a declaration of the member.
+    >>> print shortenPrivates('class K\n{\nf()\n{\nvar o = {\ncounter: 5\n};\nthis.counter = o;\n}\n}', 'K', ['counter'])
+    class K
+    {
+    f()
+    {
+    var o = {
+    counter: 5
+    };
+    this.counter = o;
+    }
+    }
+
+    Without a unique prefix, if the base class has the same name, do not rename.
+    >>> shortenPrivates('this.counter = 0;', 'K', ['counter'], 'a.K')
+    'this.counter = 0;'
+    '''
+    if not privateNames or klassName == base.split('.')[-1]:
+        return text
+    nameP = re.compile(commentOrStringP.pattern + '|' + regexLiteral
+        + r'|\b(' + '|'.join(privateNames) + r')\b', re.S | re.M)
+    unsafe = set()
+    spans = _classBodySpans(text, klassName)
+    for match in nameP.finditer(text):
+        name = match.group(1)
+        if name is None:
+            unsafe.update(re.findall(r'\w+', match.group(0)))
+        elif not _isMemberReference(text, match, klassName, spans):
+            unsafe.add(name)
+    used = set(re.findall(r'[\w\$]+', text))
+    shortNames = _shortNames('$' + klassName + '$', used)
+    renames = {}
+    for name in privateNames:
+        if name not in unsafe:
+            shortName = next(shortNames)
+            if len(shortName) < len(name):
+                renames[name] = shortName
+    if not renames:
+        return text
+    def rename(match):
+        return renames.get(match.group(1)) or match.group(0)
+    return nameP.sub(rename, text)
+
+
+def _isMemberReference(text, match, klassName, spans):
+    """Through this or the class, or a declaration directly in the class body."""
+    start = match.start(1)
+    before = text[max(0, start - len(klassName) - 12):start]
+    for owner in ['this.', klassName + '.', klassName + '.prototype.']:
+        if before.endswith(owner):
+            preceding = before[-len(owner) - 1:-len(owner)]
+            if not re.match(r'[\w\.\$]', preceding):
+                return True
+    head = text[text.rfind('\n', 0, start) + 1:start].strip()
+    after = text[match.end(1):match.end(1) + 1]
+    if head not in ('', 'static') or after not in (':', '('):
+        return False
+    s = bisect.bisect(spans, (start, len(text))) - 1
+    return 0 <= s and start < spans[s][1]
+
+
+def _classBodySpans(text, klassName):
+    r"""Sorted start and end of text directly in the body of the class,
+    which is the object of the extend idiom or the body of an ES2015 class,
+    outside of any nested bracket.
+    >>> text = 'var K = cc.Class.extend(\n{\na: 0,\nf: function()\n{\nvar o = {b: 1};\n}\n});'
+    >>> [text[start:end] for start, end in _classBodySpans(text, 'K')]
+    ['\na: 0,\nf: function', '\n', '\n']
+    """
+    name = re.escape(klassName)
+    bodyP = re.compile(r'(?:\b' + name + r'\s*=\s*[\w\.\$]+\.extend\('
+        + r'|\bclass\s+' + name + r'(?:\s+extends\s+[\w\.\$]+)?)\s*\{')
+    bodies = set()
+    for match in bodyP.finditer(text):
+        bodies.add(match.end() - 1)
+    tokenP = re.compile(commentOrStringP.pattern + '|' + regexLiteral
+        + r'|[()\[\]{}]', re.S | re.M)
+    spans = []
+    stack = []
+    for match in tokenP.finditer(text):
+        token = match.group(0)
+        if stack and stack[-1] in bodies:
+            spans.append((spanStart, match.start()))
+        if token in ')]}':
+            if stack:
+                stack.pop()
+        elif token in '([{' or token[0] in '([{':
+            stack.append(match.start())
+        if stack and stack[-1] in bodies:
+            spanStart = match.end()
+    return spans
+
+
+def _shortNames(prefix, used):
+    '''Yield prefix and a, b, ... z, aa, ... except names already used.'''
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    length = 1
+    while True:
+        for n in range(len(letters) ** length):
+            name = ''
+            for l in range(length):
+                name = letters[n % len(letters)] + name
+                n //= len(letters)
+            name = prefix + name
+            if name not in used:
+                yield name
+        length += 1
+
+
+def localStatics(parsed):
+    r"""Names of private static variables and functions to declare in the module,
+    where no other name in the class or module would shadow or collide with them.
+    Empty unless cfg.localStatics.
+    >>> cfg.localStatics = True
+    >>> localStatics(parse('package{public class C{private static var n:int;private static var a:int;public static var p:int;private static function f(a:int){}private function g(){}private static function _lazy(){}}}'))
+    ['n', 'f']
+    >>> print emit(parse('package{public class C{private static var n:int = 1;public static function g(){\n    return f(n);}private static function f(m:int){\n    return n + m;}}}'), 'commonjs')
+    "use strict";
+    function C()
+    {
+    }
+    <BLANKLINE>
+    var n = 1;
+    <BLANKLINE>
+    C.g = function()
+    {
+        return f(n);
+    };
+    <BLANKLINE>
+    function f(m)
+    {
+        return n + m;
+    }
+    <BLANKLINE>
+    module.exports = C;
+    >>> cfg.localStatics = False
+    """
+    if not cfg.localStatics:
+        return []
+    candidates = [name for name in parsed.privateNames
+        if name in parsed.staticDeclarations]
+    if not candidates:
+        return []
+    reserved = set([parsed.name, lazyImports, '_lazy', 'module', 'exports', 'require',
+        'Object', cfg.baseClass.split('.')[0], parsed.base.split('.')[0]])
+    reserved.update(name for name, module in _importNames(parsed.modules))
+    texts = []
+    for func in parsed.methods + parsed.staticMethods:
+        texts.extend([func.argumentText, func.content, func.defaults])
+    for props in [parsed.props, parsed.staticProps]:
+        for comment, name, dataType, definition in props:
+            texts.append(definition)
+    bareP = re.compile(r'(?<![\w\.\$])(' + '|'.join(candidates) + r')\b')
+    shadowed = set(bareP.findall('\n'.join(texts)))
+    return [name for name in candidates
+        if name not in shadowed and name not in reserved]
+
+
+def localReferences(text, klassName, locals):
+    r"""Reference each local static directly, except in comments and strings.
+    >>> print localReferences('C.n = C.f(C.n, D.C.n, "C.n");', 'C', ['n', 'f'])
+    n = f(n, D.C.n, "C.n");
+    """
+    if not locals:
+        return text
+    referenceP = re.compile(commentOrStringP.pattern
+        + r'|(?<![\w\.\$])' + re.escape(klassName)
+        + r'\.(' + '|'.join(locals) + r')\b', re.S)
+    def direct(match):
+        return match.group(1) or match.group(0)
+    return referenceP.sub(direct, text)
+
+
+def _writeHeader(out, parsed, bind = False):
+    """If bind, assign each imported class from its module."""
+    if cfg.lazyRequires:
+        out.write(_formatLazyRequires(parsed.modules, _localNames(parsed)))
+    else:
+        out.write(_formatRequires(parsed.modules, bind))
+    if parsed.comment:
+        out.write(indent(parsed.comment, 0) + '\n')
+
+
+def _emitExtend(parsed):
+    out = Writer()
+    _writeHeader(out, parsed)
+    locals = localStatics(parsed)
+    out.write('var ' + parsed.name + ' = ' + cfg.baseClass + '.extend(\n{\n')
+    out.depth += 1
+    _writeProps(out, parsed.props, False)
+    out.write('\n\n')
+    _writeMethods(out, parsed.name, parsed.methods)
+    out.depth -= 1
+    out.write('\n});\n\n')
+    out.write(_formatStaticProps(parsed.name, parsed.staticProps, locals))
+    out.write('\n\n')
+    _writeStaticMethods(out, parsed.name, parsed.staticMethods, locals)
+    return out.getvalue()
+
+
+def _emitClass(parsed):
+    r"""ES2015 class.  Instance props are on the prototype, as in the extend idiom.
+    Constructor assigns defined props after calling super.
+    >>> print _emitClass(parse('package{public class B extends A{public var x:int = 1;public var y:int;public function B(a:int){\n super(a);\n trace(a);}public static function f(){}}}'))
+    "use strict";
+    class B extends A
+    {
+        constructor(a)
+        {
+            super(a);
+            this.x = 1;
+            cc.log(a);
+        }
+    <BLANKLINE>
+        static f()
+        {
+        }
+    }
+    <BLANKLINE>
+    B.prototype.x = 1;
+    B.prototype.y = undefined;
+
+    Without a constructor, assign defined props in a new constructor,
+    so each instance has its own.
+    >>> print _emitClass(parse('package{public class B extends A{private var list:Array = [];}}'))
+    "use strict";
+    class B extends A
+    {
+        constructor()
+        {
+            super();
+            this.list = [];
+        }
+    }
+    <BLANKLINE>
+    B.prototype.list = [];
+    """
+    out = Writer()
+    _writeHeader(out, parsed)
+    name = parsed.name
+    head = 'class ' + name
+    if parsed.base:
+        head += ' extends ' + parsed.base
+    out.write(head + '\n{\n')
+    out.depth += 1
+    written = False
+    if name not in [func.name for func in parsed.methods]:
+        defaults = scopeMembers(parsed.instanceDeclarations,
+            _constructorDefaults(parsed.props), 'this')
+        if defaults:
+            constructor = ParsedFunc('', name, '', '', defaults)
+            _writeFunc(out, constructor, 'constructor',
+                _constructorContent(constructor, parsed.base), 'super')
+            written = True
+    for func in parsed.methods:
+        if written:
+            out.write('\n\n')
+        if name == func.name:
+            content = _constructorContent(func, parsed.base)
+            _writeFunc(out, func, 'constructor', content, 'super')
+        else:
+            _writeFunc(out, func, func.name, func.content, 'super')
+        written = True
+    locals = localStatics(parsed)
+    for func in parsed.staticMethods:
+        if func.name in locals:
+            continue
+        if written:
+            out.write('\n\n')
+        _writeFunc(out, func, 'static ' + func.name, func.content, 'super')
+        written = True
+    out.depth -= 1
+    out.write('\n}')
+    _writeStatics(out, parsed, [func for func in parsed.staticMethods
+        if func.name in locals])
+    return out.getvalue()
+
+
+def _emitCommonJS(parsed):
+    r"""Constructor function and prototype, exported as a CommonJS module.
+    >>> print _emitCommonJS(parse('package{public class B extends A{public var x:int = 1;public function f(){}}}'))
+    "use strict";
+    function B()
+    {
+        A.call(this);
+        this.x = 1;
+    }
+    <BLANKLINE>
+    B.prototype = Object.create(A.prototype);
+    B.prototype.constructor = B;
+    <BLANKLINE>
+    B.prototype.f = function()
+    {
+    };
+    <BLANKLINE>
+    B.prototype.x = 1;
+    <BLANKLINE>
+    module.exports = B;
+
+    Bind each imported class, such as the base class.
+    >>> print _emitCommonJS(parse('package{import a.A;public class B extends A{}}'))
+    /*jslint node: true */
+    "use strict";
+    <BLANKLINE>
+    var A = require("a/A.js");
+    <BLANKLINE>
+    function B()
+    {
+        A.call(this);
+    }
+    <BLANKLINE>
+    B.prototype = Object.create(A.prototype);
+    B.prototype.constructor = B;
+    <BLANKLINE>
+    module.exports = B;
+    """
+    out = Writer()
+    _writeHeader(out, parsed, True)
+    name = parsed.name
+    base = parsed.base
+    defaults = scopeMembers(parsed.instanceDeclarations,
+        _constructorDefaults(parsed.props), 'this')
+    constructor = ParsedFunc('', name, '', '', defaults)
+    methods = []
+    for func in parsed.methods:
+        if name == func.name:
+            constructor = func
+        else:
+            methods.append(func)
+    content = _constructorContent(constructor, base)
+    if base:
+        content = _callSuper(content, base)
+    _writeFunc(out, constructor, 'function ' + name, content)
+    if base:
+        out.write('\n\n' + name + '.prototype = Object.create(' + base
+            + '.prototype);\n' + name + '.prototype.constructor = ' + name + ';')
+    for func in methods:
+        out.write('\n\n')
+        _writeFunc(out, func, name + '.prototype.' + func.name + ' = function',
+            func.content)
+        out.write(';')
+    _writeStatics(out, parsed)
+    out.write('\n\nmodule.exports = ' + name + ';')
+    return out.getvalue()
+
+
+def _writeStatics(out, parsed, staticMethods = None):
+    """Prototype props, static props and static functions after the class, if any.
+    Static functions default to each in parsed class.
+    """
+    name = parsed.name
+    locals = localStatics(parsed)
+    if staticMethods is None:
+        staticMethods = parsed.staticMethods
+    prototypeProps = [[comment, declaration, dataType, definition or ' = undefined']
+        for comment, declaration, dataType, definition in parsed.props]
+    for text in [_formatStaticProps(name + '.prototype', prototypeProps),
+            _formatStaticProps(name, parsed.staticProps, locals)]:
+        if text:
+            out.write('\n\n' + text)
+    if staticMethods:
+        out.write('\n\n')
+        _writeStaticMethods(out, name, staticMethods, locals)
+
+
+def _constructorContent(func, base):
+    """Assign defined props in the constructor, after super if the class extends a base.
+    The base constructor is implicitly called, if not explicitly.
+    """
+    content = func.content
+    if not base:
+        if func.defaults:
+            content = '\n' + func.defaults + content
+        return content
+    if superClassMarker not in content:
+        content = '\n' + indentUnit + superClassMarker + '();' + content
+    if func.defaults:
+        lines = content.split('\n')
+        for l, line in enumerate(lines):
+            if superClassMarker in line:
+                lines.insert(l + 1, func.defaults)
+                break
+        content = '\n'.join(lines)
+    return content
+
+
+def _callSuper(content, base):
+    superCall = re.escape(superClassMarker) + r'\(\s*\)'
+    content = re.sub(superCall, base + '.call(this)', content)
+    return content.replace(superClassMarker + '(', base + '.call(this, ')
+
+
+emitters = {
+    'cc': _emitExtend,
+    'es2015': _emitClass,
+    'commonjs': _emitCommonJS,
+}
+
+
+def convert(text):
+    return emit(parse(text))
+
+
+def _writeIfChanged(path, text):
+    r"""Write UTF-8 text, unless the file already has the same bytes.
+    Return True if written.  Make missing directories.
+    >>> import shutil, tempfile
+    >>> directory = tempfile.mkdtemp()
+    >>> path = os.path.join(directory, 'a', 'b.js')
+    >>> _writeIfChanged(path, u'var b;')
+    True
+    >>> _writeIfChanged(path, u'var b;')
+    False
+    >>> _writeIfChanged(path, u'var c;')
+    True
+    >>> shutil.rmtree(directory)
+    """
+    data = text.encode('utf-8')
+    if os.path.isfile(path):
+        f = open(path, 'rb')
+        same = data == f.read()
+        f.close()
+        if same:
+            return False
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    f = open(path, 'wb')
+    f.write(data)
+    f.close()
+    return True
+
+
+irVersion = 3
+
+def _cachePath(asPath, cacheDir):
+    import hashlib
+    path = os.path.abspath(asPath)
+    if not isinstance(path, bytes):
+        path = path.encode('utf-8')
+    return os.path.join(cacheDir, hashlib.sha1(path).hexdigest() + '.ir')
+
+
+def parseCached(asPath, data, cacheDir = None):
+    r"""Parsed class from the cache in the directory, if the hash of source data matches.
+    Otherwise parse and save in the cache.  Without a directory, just parse.
+    Emit settings do not invalidate the cache.
+    >>> import shutil, tempfile
+    >>> cacheDir = tempfile.mkdtemp()
+    >>> asPath = realpath('test/View.as')
+    >>> data = open(asPath, 'rb').read()
+    >>> parsed = parseCached(asPath, data, cacheDir)
+    >>> parseCached(asPath, data, cacheDir) == parsed
+    True
+    >>> _loadParsed(asPath, data + ' ', cacheDir) is None
+    True
+    >>> cfgIndent = cfg.indent
+    >>> cfg.indent = '\t'
+    >>> emit(_loadParsed(asPath, data, cacheDir)) == convert(data.decode('utf-8'))
+    True
+    >>> cfg.indent = cfgIndent
+    >>> shutil.rmtree(cacheDir)
+    """
+    if cacheDir:
+        parsed = _loadParsed(asPath, data, cacheDir)
+        if parsed is not None:
+            return parsed
+    parsed = parse(data.decode('utf-8'))
+    if cacheDir:
+        _saveParsed(asPath, data, cacheDir, parsed)
+    return parsed
+
+
+def _sourceHash(data):
+    import hashlib
+    return hashlib.sha1(data).hexdigest()
+
+
+def _loadParsed(asPath, data, cacheDir):
+    import cPickle
+    cachePath = _cachePath(asPath, cacheDir)
+    if not os.path.isfile(cachePath):
+        return None
+    try:
+        f = open(cachePath, 'rb')
+        version, sourceHash, parsed = cPickle.load(f)
+        f.close()
+    except Exception:
+        return None
+    if irVersion != version or _sourceHash(data) != sourceHash:
+        return None
+    return parsed
+
+
+def _saveParsed(asPath, data, cacheDir, parsed):
+    import cPickle
+    if not os.path.isdir(cacheDir):
+        os.makedirs(cacheDir)
+    f = open(_cachePath(asPath, cacheDir), 'wb')
+    cPickle.dump((irVersion, _sourceHash(data), parsed), f,
+        cPickle.HIGHEST_PROTOCOL)
+    f.close()
+
+
+def _readBytes(path):
+    f = open(path, 'rb')
+    data = f.read()
+    f.close()
+    return data
 
 
 def convertFile(asPath, jsPath):
-    text = codecs.open(asPath, 'r', 'utf-8').read()
-    str = convert(text)
-    f = codecs.open(jsPath, 'w', 'utf-8')
-    # print(str)
-    f.write(str)
-    f.close()   
+    """Return whether a .js file was written, because it changed, and bytes of output.
+    If cfg.cacheDir, reuse the parsed class while the source is unchanged.
+    Parse once and emit each of cfg.targets.
+    If cfg.compact, also return bytes saved compared to formatted output.
+    """
+    outputs, stats = emitTargets(asPath, _readBytes(asPath), jsPath)
+    stats['written'] = _writeOutputs(outputs)
+    return stats
+
+
+def emitTargets(asPath, data, jsPath):
+    """Return path and text of each of cfg.targets, and statistics, without writing."""
+    parsed = parseCached(asPath, data, cfg.cacheDir)
+    outputs = []
+    stats = {'bytes': 0}
+    if cfg.compact:
+        stats['savedBytes'] = 0
+    for target in cfg.targets:
+        text = emit(parsed, target, False)
+        if cfg.compact:
+            formattedSize = len(text.encode('utf-8'))
+            text = compactClass(text, parsed)
+        outputs.append((targetPath(jsPath, target, cfg.targets), text))
+        size = len(text.encode('utf-8'))
+        stats['bytes'] += size
+        if cfg.compact:
+            stats['savedBytes'] += formattedSize - size
+    return outputs, stats
+
+
+def _writeOutputs(outputs):
+    written = False
+    for path, text in outputs:
+        if _writeIfChanged(path, text):
+            written = True
+    return written
+
+
+def targetPath(jsPath, target, targets):
+    r"""With more than one target, each has its own suffix.
+    >>> targetPath('src/View.js', 'cc', ['cc'])
+    'src/View.js'
+    >>> targetPath('src/View.js', 'es2015', ['cc', 'es2015'])
+    'src/View.es2015.js'
+    """
+    if len(targets) <= 1:
+        return jsPath
+    root, ext = os.path.splitext(jsPath)
+    return root + '.' + target + ext
 
 
-def convertFiles(asPaths):
-    for asPath in asPaths:
-        root, ext = os.path.splitext(asPath)
-        jsPath = root + '.js'
-        convertFile(asPath, jsPath)
+def findSources(srcDir, ext = '.as'):
+    r"""Yield each ActionScript path under the source directory, sorted per directory.
+    >>> sources = findSources(realpath('test'))
+    >>> [os.path.relpath(path, realpath('test')) for path in sources]
+    ['FlxBasic.as', 'FlxCamera.as', 'TestVector.as', 'View.as', 'as/FlxBasic.as', 'as/FlxCamera.as', 'as/View.as']
+    """
+    directories = [srcDir]
+    while directories:
+        directory = directories.pop()
+        subdirectories = []
+        if scandir:
+            entries = [(entry.name, entry.path, entry.is_dir())
+                for entry in scandir(directory)]
+        else:
+            entries = []
+            for name in os.listdir(directory):
+                path = os.path.join(directory, name)
+                entries.append((name, path, os.path.isdir(path)))
+        entries.sort()
+        for name, path, isDirectory in entries:
+            if isDirectory:
+                subdirectories.append(path)
+            elif name.endswith(ext):
+                yield path
+        directories.extend(reversed(subdirectories))
+
+
+def jsPathOf(asPath, srcDir = None, outDir = None):
+    r"""Parallel to the .as file, or mirrored from source directory into output directory.
+    >>> jsPathOf('src/com/View.as')
+    'src/com/View.js'
+    >>> jsPathOf('src/com/View.as', 'src', 'out')
+    'out/com/View.js'
+
+    Without source directory, output directory is flat.
+    >>> jsPathOf('src/com/View.as', None, 'out')
+    'out/View.js'
+    """
+    root, ext = os.path.splitext(asPath)
+    if outDir:
+        if srcDir:
+            root = os.path.relpath(root, srcDir)
+        else:
+            root = os.path.basename(root)
+        root = os.path.join(outDir, root)
+    return root + '.js'
+
+
+def _cfgValues():
+    """Settings to reapply in a worker process, which may not inherit overrides."""
+    values = {}
+    for name, value in vars(cfg).items():
+        if not name.startswith('_') \
+                and isinstance(value, (basestring, int, float, list, tuple, dict,
+                    type(None))):
+            values[name] = value
+    return values
+
+
+def _applyCfg(values):
+    for name, value in values.items():
+        setattr(cfg, name, value)
+
+
+def _newPool(processes = 1):
+    import multiprocessing
+    return multiprocessing.Pool(processes, _applyCfg, (_cfgValues(),))
+
+
+def _writeSummary(summaryPath, summary):
+    import json
+    f = codecs.open(summaryPath, 'w', 'utf-8')
+    json.dump(summary, f, indent = 4, sort_keys = True)
+    f.close()
+
+
+def _claimOutput(claimed, asPath, jsPath):
+    """Raise ValueError if another source path already writes the .js path."""
+    key = os.path.normcase(os.path.abspath(jsPath))
+    source = os.path.realpath(asPath)
+    other = claimed.setdefault(key, (source, asPath))
+    if other[0] != source:
+        raise ValueError('Both write %s:  %s, %s' % (jsPath, other[1], asPath))
+
+
+def convertFiles(asPaths, timeout = None, summaryPath = None,
+        srcDir = None, outDir = None):
+    r"""Convert each file in isolation, so one slow or failed file does not stop the others.
+    Timeout in seconds is a wall-clock budget per file, defaulting to cfg.timeout.
+    With a timeout, each file of a batch converts in a worker process, which is replaced after a timeout.
+    A single file converts in this process, which is faster, since there is no other file to protect.
+    More than one cfg.methodWorkers converts in this process, where parsing has no budget,
+    so a batch with a timeout raises ValueError.  Then the timeout is the budget for methods.
+    Paths may be a generator, such as from findSources, to stream a large tree.
+    Each .js path is from jsPathOf.
+    Return summary of each file:  path, status ('ok', 'error', 'timeout'), elapsed seconds, error,
+    and statistics from convertFile.
+
+    >>> summary = convertFiles(['missing.as'], timeout = 0)
+    >>> summary[0]['path'], summary[0]['status']
+    ('missing.as', 'error')
+    >>> summary = convertFiles(['missing.as', 'missing.as'], timeout = 30)
+    >>> [record['status'] for record in summary]
+    ['error', 'error']
+    >>> summary[0]['error'].split(':')[0]
+    'IOError'
+
+    Another file that would overwrite the output is an error.
+    >>> summary = convertFiles(['a/missing.as', 'b/missing.as'], timeout = 0, outDir = 'out')
+    >>> summary[1]['error']
+    'ValueError: Both write out/missing.js:  a/missing.as, b/missing.as'
+    >>> cfg.methodWorkers = 2
+    >>> convertFiles(['missing.as', 'missing.as'], timeout = 30)
+    Traceback (most recent call last):
+    ...
+    ValueError: Method workers convert a batch without a timeout.  Set timeout 0.
+    >>> cfg.methodWorkers = 1
+    """
+    import itertools
+    import multiprocessing
+    if timeout is None:
+        timeout = cfg.timeout
+    asPaths = iter(asPaths)
+    firstPaths = list(itertools.islice(asPaths, 2))
+    asPaths = itertools.chain(firstPaths, asPaths)
+    isolate = timeout and 2 <= len(firstPaths)
+    if isolate and 2 <= cfg.methodWorkers:
+        raise ValueError('Method workers convert a batch without a timeout.  Set timeout 0.')
+    summary = []
+    claimed = {}
+    pool = None
+    try:
+        for asPath in asPaths:
+            jsPath = jsPathOf(asPath, srcDir, outDir)
+            if isolate and pool is None:
+                pool = _newPool()
+            record = {'path': asPath, 'status': 'ok', 'error': None,
+                'written': False}
+            start = time.time()
+            try:
+                _claimOutput(claimed, asPath, jsPath)
+                if isolate:
+                    record.update(pool.apply_async(convertFile,
+                        (asPath, jsPath)).get(timeout))
+                else:
+                    record.update(convertFile(asPath, jsPath))
+            except multiprocessing.TimeoutError:
+                record['status'] = 'timeout'
+                record['error'] = 'Exceeded %s seconds.' % timeout
+                if pool is not None:
+                    pool.terminate()
+                    pool = None
+            except Exception as err:
+                record['status'] = 'error'
+                record['error'] = '%s: %s' % (type(err).__name__, err)
+            record['elapsed'] = round(time.time() - start, 3)
+            summary.append(record)
+    finally:
+        if pool is not None:
+            pool.terminate()
+    if summaryPath:
+        _writeSummary(summaryPath, summary)
+    return summary
+
+
+def pipeline(asPaths, workers = None, depth = None, timeout = None,
+        summaryPath = None, srcDir = None, outDir = None):
+    r"""Convert files in overlapping stages, for a large tree on slow storage.
+    A reader thread prefetches source files, workers convert them,
+    and a writer thread writes the .js files in the order of the paths.
+    Depth bounds files in each queue, so memory is bounded however many files there are.
+    Workers is a number of processes, defaulting to cfg.pipelineWorkers.
+    With 0 workers, convert in this process, while reading and writing still overlap.
+    Timeout in seconds is a wall-clock budget per file, defaulting to cfg.timeout.
+    Return summary like convertFiles, with bytes read of each file,
+    and elapsed seconds of each file since it was submitted to convert.
+    Also return elapsed seconds of the whole pipeline.
+    An error while listing paths stops the pipeline and raises in this thread.
+    A worker process cannot fan out methods, so more than one cfg.methodWorkers
+    with pipeline workers raises ValueError.
+
+    >>> import shutil, tempfile
+    >>> summary, elapsed = pipeline([realpath('test/TestVector.as'), 'missing.as'], 0,
+    ...     outDir = tempfile.mkdtemp())
+    >>> [(os.path.basename(record['path']), record['status']) for record in summary]
+    [('TestVector.as', 'ok'), ('missing.as', 'error')]
+    >>> summary[0]['written'], 0 < summary[0]['sourceBytes'], summary[1]['error'].split(':')[0]
+    (True, True, 'IOError')
+    >>> [type(record['elapsed']) for record in summary]
+    [<type 'float'>, <type 'float'>]
+    >>> shutil.rmtree(os.path.dirname(summary[0]['jsPath']))
+    >>> cfg.methodWorkers = 2
+    >>> pipeline([], 1)
+    Traceback (most recent call last):
+    ...
+    ValueError: Method workers need pipeline workers 0.
+    >>> cfg.methodWorkers = 1
+    >>> pipeline(findSources('missing'), 0)
+    Traceback (most recent call last):
+    ...
+    OSError: [Errno 2] No such file or directory: 'missing'
+    """
+    import collections
+    import multiprocessing
+    import Queue
+    import threading
+    if workers is None:
+        workers = cfg.pipelineWorkers
+    if workers and 2 <= cfg.methodWorkers:
+        raise ValueError('Method workers need pipeline workers 0.')
+    if depth is None:
+        depth = cfg.pipelineDepth
+    if timeout is None:
+        timeout = cfg.timeout
+    readQueue = Queue.Queue(depth)
+    writeQueue = Queue.Queue(depth)
+
+    def read():
+        """Always end with None, or the error that stopped listing paths."""
+        end = None
+        try:
+            for asPath in asPaths:
+                try:
+                    jsPath = jsPathOf(asPath, srcDir, outDir)
+                    data = _readBytes(asPath)
+                except Exception as err:
+                    readQueue.put((asPath, None, None, err))
+                else:
+                    readQueue.put((asPath, jsPath, data, None))
+        except Exception as err:
+            end = err
+        finally:
+            readQueue.put(end)
+
+    def write():
+        while True:
+            item = writeQueue.get()
+            if item is None:
+                break
+            record, outputs = item
+            try:
+                record['written'] = _writeOutputs(outputs)
+            except Exception as err:
+                record['status'] = 'error'
+                record['error'] = '%s: %s' % (type(err).__name__, err)
+
+    def fail(record, err):
+        record['status'] = 'error'
+        record['error'] = '%s: %s' % (type(err).__name__, err)
+
+    def submit(entry):
+        record, data = entry[0], entry[1]
+        entry[2] = pool.apply_async(emitTargets,
+            (record['path'], data, record['jsPath']))
+        entry[3] = time.time()
+
+    def collect(entry):
+        """Wait for oldest conversion.  After a timeout, restart the others."""
+        record, data, result, submitted = entry
+        try:
+            outputs, stats = result.get(timeout or None)
+        except multiprocessing.TimeoutError:
+            record['status'] = 'timeout'
+            record['error'] = 'Exceeded %s seconds.' % timeout
+            return None, True
+        except Exception as err:
+            fail(record, err)
+            return None, False
+        finally:
+            record['elapsed'] = round(time.time() - submitted, 3)
+        record.update(stats)
+        return outputs, False
+
+    reader = threading.Thread(target = read)
+    reader.daemon = True
+    writer = threading.Thread(target = write)
+    writer.start()
+    reader.start()
+    summary = []
+    claimed = {}
+    converting = collections.deque()
+    pool = None
+    if workers:
+        pool = _newPool(workers)
+    start = time.time()
+    try:
+        done = False
+        while not done or converting:
+            while not done and len(converting) < depth:
+                item = readQueue.get()
+                if item is None:
+                    done = True
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                asPath, jsPath, data, err = item
+                record = {'path': asPath, 'jsPath': jsPath, 'status': 'ok',
+                    'error': None, 'written': False, 'sourceBytes': 0,
+                    'elapsed': 0.0}
+                summary.append(record)
+                if err is None:
+                    try:
+                        _claimOutput(claimed, asPath, jsPath)
+                    except ValueError as claimError:
+                        err = claimError
+                if err is not None:
+                    fail(record, err)
+                    continue
+                record['sourceBytes'] = len(data)
+                if pool is None:
+                    submitted = time.time()
+                    try:
+                        outputs, stats = emitTargets(asPath, data, jsPath)
+                    except Exception as err:
+                        fail(record, err)
+                    else:
+                        record.update(stats)
+                        writeQueue.put((record, outputs))
+                    record['elapsed'] = round(time.time() - submitted, 3)
+                    continue
+                entry = [record, data, None, None]
+                submit(entry)
+                converting.append(entry)
+                if converting[0][2].ready():
+                    break
+            if converting:
+                entry = converting.popleft()
+                outputs, timedOut = collect(entry)
+                if outputs is not None:
+                    writeQueue.put((entry[0], outputs))
+                if timedOut:
+                    pool.terminate()
+                    pool = _newPool(workers)
+                    for entry in converting:
+                        submit(entry)
+    finally:
+        if pool is not None:
+            pool.terminate()
+        writeQueue.put(None)
+        writer.join()
+    elapsed = time.time() - start
+    if summaryPath:
+        _writeSummary(summaryPath, summary)
+    return summary, elapsed
+
+
+def throughput(summary, elapsed):
+    r"""Files and megabytes read per second.
+    >>> throughput([{'sourceBytes': 1000000}, {'sourceBytes': 1000000}], 2.0)
+    '2 files in 2.00 seconds:  1.0 files/s, 1.00 MB/s'
+    """
+    megabytes = sum(record.get('sourceBytes', 0) for record in summary) / 1e6
+    elapsed = max(elapsed, 1e-6)
+    return '%i files in %.2f seconds:  %.1f files/s, %.2f MB/s' % (
+        len(summary), elapsed, len(summary) / elapsed, megabytes / elapsed)
+
+
+def _parseArgs(argv):
+    import argparse
+    parser = argparse.ArgumentParser(usage = __doc__)
+    parser.add_argument('paths', nargs = '*')
+    parser.add_argument('--timeout', type = float, default = cfg.timeout)
+    parser.add_argument('--summary', default = None)
+    parser.add_argument('--method-workers', type = int,
+        default = cfg.methodWorkers)
+    parser.add_argument('--cache', default = cfg.cacheDir)
+    parser.add_argument('--target', action = 'append',
+        choices = sorted(emitters))
+    parser.add_argument('--lazy-requires', action = 'store_true',
+        default = cfg.lazyRequires)
+    parser.add_argument('--compact', action = 'store_true',
+        default = cfg.compact)
+    parser.add_argument('--local-statics', action = 'store_true',
+        default = cfg.localStatics)
+    parser.add_argument('--pipeline', type = int, default = None,
+        metavar = 'WORKERS')
+    parser.add_argument('--depth', type = int, default = cfg.pipelineDepth)
+    parser.add_argument('--src', default = None)
+    parser.add_argument('--out', default = None)
+    return parser.parse_args(argv)
+
+
+def _sourcePaths(options):
+    for path in options.paths:
+        yield path
+    if options.src:
+        for path in findSources(options.src):
+            yield path
+
+
+def _checkPaths(paths, srcDir, outDir):
+    r"""Return usage error, if any:  a missing source directory,
+    a path outside it, which would be written outside the output directory,
+    or paths that would write the same output.
+    >>> _checkPaths([realpath('test/View.as')], realpath('test'), 'out')
+    >>> _checkPaths(['View.as'], realpath('test'), 'out')
+    'Path is outside source directory:  View.as'
+    >>> _checkPaths([], 'missing', 'out')
+    'Source directory not found:  missing'
+    >>> _checkPaths(['test/View.as', 'test/as/View.as'], None, 'out')
+    'Both write out/View.js:  test/View.as, test/as/View.as'
+    """
+    if srcDir:
+        if not os.path.isdir(srcDir):
+            return 'Source directory not found:  %s' % srcDir
+        if outDir:
+            for path in paths:
+                if os.path.relpath(path, srcDir).startswith(os.pardir):
+                    return 'Path is outside source directory:  %s' % path
+    claimed = {}
+    for path in paths:
+        try:
+            _claimOutput(claimed, path, jsPathOf(path, srcDir, outDir))
+        except ValueError as err:
+            return str(err)
+    return None
+
 
 def realpath(path):
     """
@@ -907,21 +2593,122 @@ def realpath(path):
 def _testCfg():
     """Overrides cfg, so perform this after all operations.
     Tests expect indent 4-spaces.
+    Return number of failures.
     """
     cfg.indent = '    '
     cfg.log = 'cc.log'
     cfg.requireSubs = [['flash/display', 'src/View']]
     cfg.superClass = 'this._super'
     import doctest
-    doctest.testmod()
+    failed, attempted = doctest.testmod()
     import glob
-    convertFiles(glob.glob(realpath('test/*.as')))
+    summary = convertFiles(glob.glob(realpath('test/*.as')))
+    for record in summary:
+        if 'ok' != record['status']:
+            failed += 1
+    return failed
 
 
-if '__main__' == __name__:
-    import sys
-    if len(sys.argv) <= 1:
+def selftest():
+    """Return exit code."""
+    if _testCfg():
+        return 1
+    return 0
+
+
+def bench(repeat = 5):
+    """Time a new process that converts one file, as a tool integration would.
+    Print the best time.  Return exit code 1 if over cfg.benchBudget seconds.
+    """
+    import shutil
+    import subprocess
+    import tempfile
+    outDir = tempfile.mkdtemp()
+    command = [sys.executable, realpath('as2js.py'), 'convert',
+        '--out', outDir, realpath('test/View.as')]
+    times = []
+    try:
+        for r in range(repeat):
+            start = time.time()
+            code = subprocess.call(command)
+            times.append(time.time() - start)
+            if code:
+                return code
+    finally:
+        shutil.rmtree(outDir)
+    best = min(times)
+    print 'startup and convert View.as: %.3f seconds (budget %.3f)' % (
+        best, cfg.benchBudget)
+    if cfg.benchBudget < best:
+        return 1
+    return 0
+
+
+def main(argv):
+    """Return exit code:  0 if each file converted, 1 if any failed, 2 if usage error."""
+    if not argv:
+        print __doc__
+        return 2
+    command = argv[0]
+    if command in ('selftest', '--test'):
+        return selftest()
+    if 'bench' == command:
+        return bench()
+    if 'startup' == command:
+        options = _parseArgs(argv[1:])
+        if 1 != len(options.paths) or not options.src:
+            print __doc__
+            return 2
+        startupReport(options.paths[0], options.src)
+        return 0
+    if 'convert' == command:
+        argv = argv[1:]
+    options = _parseArgs(argv)
+    if not options.paths and not options.src:
         print __doc__
-    if 2 <= len(sys.argv) and '--test' != sys.argv[1]:
-        convertFiles(sys.argv[1:])
-    _testCfg()
+        return 2
+    error = _checkPaths(options.paths, options.src, options.out)
+    if error:
+        sys.stderr.write(error + '\n')
+        return 2
+    cfg.timeout = options.timeout
+    cfg.methodWorkers = options.method_workers
+    cfg.cacheDir = options.cache
+    if options.target:
+        cfg.targets = options.target
+    cfg.lazyRequires = options.lazy_requires
+    if cfg.lazyRequires and ['commonjs'] != list(set(cfg.targets)):
+        sys.stderr.write('Lazy requires expect each module to export its class.'
+            '  Use only --target commonjs.\n')
+        return 2
+    cfg.compact = options.compact
+    cfg.localStatics = options.local_statics
+    if options.pipeline is None:
+        try:
+            summary = convertFiles(_sourcePaths(options), options.timeout,
+                options.summary, options.src, options.out)
+        except ValueError as err:
+            sys.stderr.write('%s\n' % err)
+            return 2
+    else:
+        try:
+            summary, elapsed = pipeline(_sourcePaths(options), options.pipeline,
+                options.depth, options.timeout, options.summary,
+                options.src, options.out)
+        except ValueError as err:
+            sys.stderr.write('%s\n' % err)
+            return 2
+        sys.stderr.write(throughput(summary, elapsed) + '\n')
+    code = 0
+    for record in summary:
+        if 'ok' != record['status']:
+            sys.stderr.write('%s: %s\n' % (record['path'], record['error']))
+            code = 1
+        elif 'savedBytes' in record:
+            print '%s: %i bytes, saved %i bytes' % (record['path'],
+                record['bytes'], record['savedBytes'])
+    return code
+
+
+if '__main__' == __name__:
+    sys.exit(main(sys.argv[1:]))
@@ -5,6 +5,16 @@ requireSubs = [
     ['flash/display', 'src/View'],
 ]
 superClass = 'this._super'
+timeout = 60
+benchBudget = 1.0
+methodWorkers = 1
+cacheDir = None
+targets = ['cc']
+lazyRequires = False
+compact = False
+localStatics = False
+pipelineWorkers = 1
+pipelineDepth = 16
 
 try:
     from as2js_cfg_override import *